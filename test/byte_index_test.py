@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+import os
+import tempfile
+from cStringIO import StringIO
+
+from xmlschemaparser import from_wsdl_filename, ByteIndex, load_index_file, \
+    Interner
+from xmlschemaparser.Parser import parse_xml_filename
+
+item_path = u'ItemSearchResponse/Items/Item'
+argument_path = u'ItemSearchResponse/OperationRequest/Arguments/Argument'
+
+schema_parser = from_wsdl_filename("AWSECommerceService.wsdl")
+index = ByteIndex([item_path, argument_path])
+expected = schema_parser.parse_filename("result.xml", index)
+assert expected == schema_parser.parse_filename("result.xml")
+
+items = expected['Items'][0]['Item']
+arguments = expected['OperationRequest']['Arguments']['Argument']
+assert len(index.keys(item_path)) == len(items)
+assert len(index.keys(argument_path)) == len(arguments)
+
+def check(data_file, index):
+    for key in index.keys(item_path):
+        assert schema_parser.parse_subtree(data_file, index, key) \
+            == items[key[1]]
+    for key in index.keys(argument_path):
+        assert schema_parser.parse_subtree(data_file, index, key) \
+            == arguments[key[1]]
+
+check(file("result.xml", "r"), index)
+
+# Reusing an index replaces its entries rather than adding to them.
+entries = dict((path, [list(entry) for entry in entries])
+    for path, entries in index.entries.items())
+schema_parser.parse_filename("result.xml", index)
+assert index.entries == entries
+
+# parse_subtree empties a per-parse interner like parse does.
+schema_parser.interner = Interner(persistent=False)
+check(file("result.xml", "r"), index)
+assert len(schema_parser.interner) == 0 and schema_parser.interner.hits > 0
+schema_parser.interner = None
+
+# The index survives a round trip through a sidecar file.
+sidecar = StringIO()
+index.save_file(sidecar)
+sidecar.seek(0)
+loaded = load_index_file(sidecar)
+assert loaded.entries == index.entries and loaded.root_uri == index.root_uri
+check(file("result.xml", "r"), loaded)
+
+# Empty element tags, with '>' in an attribute value
+data = file("result.xml", "r").read() \
+    .replace('></Argument>', '/>') \
+    .replace('Name="Operation"', 'Name="Opera>tion"')
+fd, filename = tempfile.mkstemp()
+try:
+    os.write(fd, data)
+    os.close(fd)
+    index = ByteIndex([argument_path])
+    parse_xml_filename(filename, index)
+    key = (argument_path, 0)
+    assert index.read_fragment(file(filename, "r"), key).endswith('/>')
+    assert schema_parser.parse_subtree_filename(filename, index, key)[
+        'Name'] == u'Opera>tion'
+finally:
+    os.remove(filename)
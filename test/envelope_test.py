@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+from xmlschemaparser import from_wsdl_filename, ResultCache
+from xmlschemaparser.Parser import parse_envelope_string
+
+schema_parser = from_wsdl_filename("AWSECommerceService.wsdl")
+expected = schema_parser.parse_filename("result.xml")
+
+payload = file("result.xml", "r").read().split('?>', 1)[1]
+
+envelope = '''<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Header>
+    <auth:Token xmlns:auth="urn:example">secret<auth:Nested/></auth:Token>
+  </soap:Header>
+  <soap:Body>
+    %s
+  </soap:Body>
+</soap:Envelope>
+''' % (payload,)
+
+assert schema_parser.parse_envelope_string(envelope) == expected
+
+# The header is skipped unless asked for.
+assert parse_envelope_string(envelope).header is None
+doc = parse_envelope_string(envelope, keep_header=True)
+token, = doc.header.findall(u'urn:example', u'Token')
+assert token.children[0] == u'secret'
+assert schema_parser.parse_envelope(doc) == expected
+
+# No header at all, SOAP 1.2
+envelope_12 = '''<env:Envelope xmlns:env="http://www.w3.org/2003/05/soap-envelope"
+><env:Body>%s</env:Body></env:Envelope>''' % (payload,)
+assert schema_parser.parse_envelope_string(envelope_12) == expected
+
+# Through the cache
+schema_parser.cache = ResultCache()
+assert schema_parser.parse_envelope_string(envelope) == expected
+assert schema_parser.parse_envelope_string(envelope) == expected
+assert schema_parser.cache.hits == 1
+schema_parser.cache = None
+
+envelope_template = '''<soap:Envelope
+xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">%s</soap:Envelope>'''
+
+fault = '''<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+<soap:Body><soap:Fault><faultcode>soap:Server</faultcode>
+<faultstring>It broke</faultstring></soap:Fault></soap:Body></soap:Envelope>'''
+try:
+    schema_parser.parse_envelope_string(fault)
+except ValueError, e:
+    assert 'It broke' in str(e)
+else:
+    raise AssertionError("fault wasn't raised")
+
+fault = fault.replace('It broke', 'Es ist kaputtgegangen \xc3\xa4')
+try:
+    schema_parser.parse_envelope_string(fault)
+except ValueError, e:
+    assert u'kaputtgegangen \xe4' in str(e).decode('utf-8')
+else:
+    raise AssertionError("fault wasn't raised")
+
+body = '<soap:Body>%s</soap:Body>' % (payload,)
+for bad in (payload,
+            envelope_template % (body + body,),
+            envelope_template % ('<soap:Body/>',),
+            envelope_template % ('<soap:Body>%s%s</soap:Body>' % (
+                payload, payload),),
+            envelope_template % ('<soap:Body>%s junk</soap:Body>' % (
+                payload,),),
+            envelope_template % ('junk' + body,),
+            envelope_template % (body + '<soap:Header/>',)):
+    try:
+        schema_parser.parse_envelope_string(bad)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("%r... isn't a valid envelope" % (bad[:80],))
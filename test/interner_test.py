@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+from xmlschemaparser import from_wsdl_filename, Interner
+
+def leaves(value):
+    """The repr of every leaf, so values that are equal but read
+    differently, such as Decimal('1.0') and Decimal('1.00'), don't match."""
+    if isinstance(value, dict):
+        return sorted((key, leaves(member))
+            for key, member in value.iteritems())
+    if isinstance(value, list):
+        return [leaves(member) for member in value]
+    return repr(value)
+
+plain_parser = from_wsdl_filename("AWSECommerceService.wsdl")
+expected = plain_parser.parse_filename("result.xml")
+
+# Equal values read from different text stay as they were read.
+interner = Interner()
+schema_parser = from_wsdl_filename("AWSECommerceService.wsdl",
+    interner=interner)
+for type_name, texts in (('decimal', (u'1.0', u'1.00', u'1')),
+                         ('double', (u'0', u'-0')),
+                         ('int', (u'1', u'01'))):
+    for text in texts * 2:
+        value = schema_parser.parse_data_as_builtin_type(type_name, text)
+        assert repr(value) == repr(
+            plain_parser.parse_data_as_builtin_type(type_name, text))
+
+for subtrees in (False, True):
+    interner = Interner(subtrees=subtrees)
+    schema_parser = from_wsdl_filename("AWSECommerceService.wsdl",
+        interner=interner)
+    result = schema_parser.parse_filename("result.xml")
+    assert leaves(result) == leaves(expected)
+
+    print "subtrees=%r: %r" % (subtrees, interner.stats())
+
+# A second parse with a persistent table only finds values it has seen.
+schema_parser.parse_filename("result.xml")
+assert interner.misses == interner.stats()['size']
+
+# A small table evicts, but still gives the right answer.
+interner = Interner(maxsize=10)
+schema_parser = from_wsdl_filename("AWSECommerceService.wsdl",
+    interner=interner)
+assert leaves(schema_parser.parse_filename("result.xml")) == leaves(expected)
+assert len(interner) <= 10 and interner.evictions > 0
+
+# A per-parse table is emptied afterwards.
+interner = Interner(persistent=False)
+schema_parser = from_wsdl_filename("AWSECommerceService.wsdl",
+    interner=interner)
+assert schema_parser.parse_filename("result.xml") == expected
+assert len(interner) == 0 and interner.hits > 0
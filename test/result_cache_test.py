@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+import copy
+import time
+
+from xmlschemaparser import from_wsdl_filename, ResultCache
+
+plain_parser = from_wsdl_filename("AWSECommerceService.wsdl")
+expected = plain_parser.parse_filename("result.xml")
+data = file("result.xml", "r").read()
+
+cache = ResultCache()
+schema_parser = from_wsdl_filename("AWSECommerceService.wsdl", cache=cache)
+
+first = schema_parser.parse_filename("result.xml")
+second = schema_parser.parse_string(data)
+assert first is second
+assert first == expected
+assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+# Cached results can't be changed, but copies can.
+for mutate in (lambda: first.__setitem__('Items', None),
+               lambda: first['Items'].append(None),
+               lambda: first.update({})):
+    try:
+        mutate()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("cached result was modified")
+
+# Nor can the attributes of <extension> values.
+memory = first['Items'][0]['Item'][0]['ItemAttributes']['SystemMemorySize']
+for mutate in (lambda: setattr(memory, 'Units', 'HACKED'),
+               lambda: delattr(memory, 'Units')):
+    try:
+        mutate()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("cached result was modified")
+assert schema_parser.parse_filename("result.xml")['Items'][0]['Item'][0][
+    'ItemAttributes']['SystemMemorySize'].Units == u'MB'
+
+mutable = copy.deepcopy(first)
+mutable['Items'].append(None)
+assert type(mutable) is dict and mutable != first
+for copied in (copy.copy(memory),
+               mutable['Items'][0]['Item'][0]['ItemAttributes'][
+                   'SystemMemorySize']):
+    assert copied == memory and copied.Units == u'MB'
+    copied.Units = u'GB'
+assert memory.Units == u'MB'
+
+# Results that aren't cached stay mutable.
+memory = expected['Items'][0]['Item'][0]['ItemAttributes']['SystemMemorySize']
+memory.Units = u'GB'
+assert copy.deepcopy(memory).Units == u'GB'
+
+# Different bytes don't hit.
+schema_parser.parse_string(data.replace('HmacSHA256', 'HmacSHA1'))
+assert cache.stats()['misses'] == 2
+
+# A different schema doesn't hit either.
+other_parser = from_wsdl_filename("AWSECommerceService.wsdl", cache=cache)
+other_parser.fingerprint = 'other'
+other_parser.parse_string(data)
+assert cache.stats()['misses'] == 3
+
+# Eviction by count and by size.
+cache = ResultCache(maxcount=1)
+schema_parser.cache = cache
+schema_parser.parse_string(data)
+schema_parser.parse_string(data + ' ')
+assert len(cache) == 1 and cache.evictions == 1
+
+cache = ResultCache(maxbytes=len(data) + 1)
+schema_parser.cache = cache
+schema_parser.parse_string(data)
+schema_parser.parse_string(data + ' ')
+assert len(cache) == 1 and cache.nbytes == len(data) + 1
+
+cache = ResultCache(maxbytes=len(data) - 1)
+schema_parser.cache = cache
+schema_parser.parse_string(data)
+assert len(cache) == 0
+
+# Hits should cost little more than hashing.
+schema_parser.cache = ResultCache()
+schema_parser.parse_string(data)
+start = time.time()
+for i in range(100):
+    schema_parser.parse_string(data)
+hit_time = (time.time() - start) / 100
+start = time.time()
+plain_parser.parse_string(data)
+miss_time = time.time() - start
+print "hit: %.6fs miss: %.6fs" % (hit_time, miss_time)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+import time
+from multiprocessing.pool import ThreadPool
+
+from xmlschemaparser import from_wsdl_filename, Interner, ResultCache
+from xmlschemaparser.Parser import parse_xml_string
+
+data = file("result.xml", "r").read()
+schema_parser = from_wsdl_filename("AWSECommerceService.wsdl")
+expected = schema_parser.parse_string(data)
+
+calls = 16
+
+def bench(name, parse, check=True):
+    # Only keep whether each result was right. Holding on to every result
+    # makes the garbage collector slower and slower as the run goes on.
+    if check:
+        call = lambda data: parse(data) == expected
+    else:
+        call = lambda data: parse(data) is not None
+
+    print name
+    for threads in (1, 2, 4, 8):
+        pool = ThreadPool(threads)
+        start = time.time()
+        results = pool.map(call, [data] * calls)
+        elapsed = time.time() - start
+        pool.close()
+        pool.join()
+        assert all(results)
+        print "  %d threads: %.6fs per call, %.1f calls/s" % (
+            threads, elapsed / calls, calls / elapsed)
+
+# One parser, shared by every thread
+bench("dom only", parse_xml_string, check=False)
+bench("shared parser", schema_parser.parse_string)
+
+schema_parser.interner = Interner()
+bench("shared parser, shared interner", schema_parser.parse_string)
+assert schema_parser.interner.misses == len(schema_parser.interner)
+
+schema_parser.interner = Interner(persistent=False)
+
+def parse_per_thread(data):
+    # len() only sees the calling thread's table, so look from the worker.
+    result = schema_parser.parse_string(data)
+    assert len(schema_parser.interner) == 0
+    return result
+
+bench("shared parser, per-thread interner", parse_per_thread)
+assert schema_parser.interner.hits > 0
+
+schema_parser.interner = None
+schema_parser.cache = ResultCache()
+bench("shared parser, shared cache", schema_parser.parse_string)
+assert schema_parser.cache.hits + schema_parser.cache.misses == 4 * calls
+assert len(schema_parser.cache) == 1
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""Contains an index of where elements are in a parsed file."""
+
+__ALL__ = [
+    'ByteIndex',
+    'load_index_file',
+    'load_index_filename',
+]
+
+import json
+
+def load_index_filename(filename):
+    return load_index_file(file(filename, "r"))
+
+def load_index_file(file_):
+    """Read a ByteIndex written by ByteIndex.save_file."""
+    saved = json.load(file_)
+    index = ByteIndex(saved['entries'].keys())
+    index.root_uri = saved['root_uri']
+    index.encoding = saved['encoding']
+    for path, entries in saved['entries'].items():
+        index.entries[path] = [list(entry) for entry in entries]
+    return index
+
+def find_fragment_end(data, start, close):
+    """Given the data of a file, and the start and close offsets of an
+    entry, return the offset just past the element, or None if data stops
+    too soon to tell."""
+    if data.startswith('</', close):
+        # expat gives the start of an end tag, which has no attributes.
+        end = data.find('>', close)
+        if end < 0:
+            return None
+        return end + 1
+
+    if close != start:
+        # expat gives the end of an empty element tag.
+        return close
+
+    # Some versions of expat give the start of an empty element tag. Look
+    # for its end, stepping over quoted attribute values.
+    quote = None
+    for i in xrange(start, len(data)):
+        c = data[i]
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c == '>':
+            return i + 1
+    return None
+
+class ByteIndex(object):
+    """Where the elements at chosen paths are in a file, so they can be
+    parsed again later without parsing the whole file. Pass one to
+    Parser.parse_xml_file, or to XMLSchemaParser.parse_file, to fill it in.
+
+paths: The paths to index. A path is the local names from the root down,
+       joined with '/', such as u'ItemSearchResponse/Items/Item'.
+
+entries: For each path, a list of [start, close, namespace] in the order
+         the elements appear. start is the offset of the start tag. close
+         is the offset expat gave for the end of the element, which for
+         most elements is the start of the end tag. namespace is the
+         namespace prefixes in scope around the element.
+
+root_uri: The namespace of the root element, for finding it in the schema.
+
+encoding: The encoding the document declared, if any.
+
+An entry is found with a key, (path, position), where position counts from
+0 among the elements at that path.
+"""
+
+    def __init__(self, paths):
+        self.entries = dict((unicode(path), []) for path in paths)
+        self.root_uri = None
+        self.encoding = None
+
+    def clear(self):
+        """Forget all the entries, keeping the paths."""
+        for entries in self.entries.itervalues():
+            del entries[:]
+        self.root_uri = None
+        self.encoding = None
+
+    def get_paths(self):
+        return self.entries.keys()
+    paths = property(get_paths)
+
+    def keys(self, path):
+        """Return the keys of all the entries at path."""
+        return [(path, position)
+            for position in xrange(len(self.entries[path]))]
+
+    def __getitem__(self, key):
+        path, position = key
+        return self.entries[path][position]
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.itervalues())
+
+    def read_fragment(self, data_file, key):
+        """Return the bytes of the element key from data_file, which must be
+        the file the index was made from."""
+        start, close, namespace = self[key]
+
+        data_file.seek(start)
+        # Most end tags fit in the extra bytes.
+        data = data_file.read(close - start + 256)
+        while True:
+            end = find_fragment_end(data, 0, close - start)
+            if end is not None:
+                return data[:end]
+
+            more = data_file.read(4096)
+            if not more:
+                raise ValueError("File ends inside %r" % (key,))
+            data += more
+
+    def save_filename(self, filename):
+        self.save_file(file(filename, "w"))
+
+    def save_file(self, file_):
+        """Write the index out, to be read with load_index_file. It is
+        usually kept next to the file it indexes."""
+        json.dump(dict(
+            root_uri = self.root_uri,
+            encoding = self.encoding,
+            entries = self.entries), file_)
+        file_.flush()
+
+    def __repr__(self):
+        return '<ByteIndex %d paths, %d entries at %#x>' % (
+            len(self.entries), len(self), id(self))
@@ -16,6 +16,9 @@ children: The child elements. (This is a list to make it compliant with an
           Element.)
 
 namespace: The namespace of the document.
+
+header: The SOAP Header element, if the document came from a SOAP Envelope
+        and the header was kept. Otherwise None.
 """
 
     def __init__(self, version, standalone):
@@ -23,3 +26,4 @@ namespace: The namespace of the document.
         self.standalone = standalone
         self.children = []
         self.namespace = {}
+        self.header = None
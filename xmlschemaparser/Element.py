@@ -45,12 +45,13 @@ namespace: The namespace of this element. This is likely a copy of the parent
 
     def translate_name(self, name):
         """Given 'namespace_id:name', or even just 'name', translate it into a
-        (namespace_url, name) pair."""
+        (namespace_url, name) pair. Without a prefix or a default namespace,
+        the namespace_url is None."""
         if name.find(':') >= 0:
             namespace_id, name = name.split(':', 1)
+            namespace_uri = self.namespace[namespace_id]
         else:
-            namespace_id = u''
-        namespace_uri = self.namespace[namespace_id]
+            namespace_uri = self.namespace.get(u'')
         return namespace_uri, name
 
     def get_fullname(self):
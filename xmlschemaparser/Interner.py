@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+"""Contains a table for sharing repeated values between parse results."""
+
+__ALL__ = [
+    'Interner'
+]
+
+from collections import deque
+import decimal
+import sys
+import threading
+
+class Interner(object):
+    """A bounded table of canonical values. Parsing the same value twice
+    gives back the same object, so large results with many repeated values
+    (currency codes, 'Binding', 'ProductGroup', ...) only keep one copy.
+
+maxsize: The most entries to keep. Once the table is full, an entry that
+         hasn't been used since the last time eviction passed over it is
+         evicted for each one added (the "second chance" approximation of
+         least recently used). None means no limit.
+
+Leaf values are looked up by the text they were read from, so values that
+compare equal but read differently, such as Decimal('1.0') and
+Decimal('1.00'), are never merged.
+
+subtrees: If true, dicts and lists whose members are all canonical are
+          shared too. Shared subtrees must not be modified by the caller.
+
+persistent: If true, the table survives from one parse to the next, so
+            long-running services share values across parses. It is shared
+            by all threads. Otherwise each thread has a table of its own,
+            which is cleared after each parse.
+
+hits, misses, evictions: Counters of lookups and evicted entries.
+
+bytes_saved: Approximate number of bytes not allocated because a duplicate
+             was replaced by the canonical object.
+"""
+
+    # Only these leaf types are immutable and safe to share. Values from
+    # <extension> get a class of their own and attributes set on them, so
+    # they are never shared.
+    leaf_types = frozenset((
+        unicode, str, int, long, float, bool, decimal.Decimal))
+
+    def __init__(self, maxsize=100000, subtrees=False, persistent=True):
+        self.maxsize = maxsize
+        self.subtrees = subtrees
+        self.persistent = persistent
+        # Each table maps a key to [value, used since last passed over].
+        # Its ring holds the keys in the order eviction visits them.
+        self.shared_tables = {}, deque()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def get_tables(self):
+        """Return the table and ring this thread should use."""
+        if self.persistent:
+            return self.shared_tables
+
+        try:
+            return self.local.tables
+        except AttributeError:
+            tables = self.local.tables = {}, deque()
+            return tables
+
+    def get_table(self):
+        return self.get_tables()[0]
+    table = property(get_table)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    def stats(self):
+        """Return the counters as a dict."""
+        return dict(
+            size = len(self.table),
+            hits = self.hits,
+            misses = self.misses,
+            evictions = self.evictions,
+            bytes_saved = self.bytes_saved)
+
+    def clear(self):
+        """Forget every canonical value, or only this thread's if the table
+        isn't persistent. The counters are kept."""
+        table, ring = self.get_tables()
+        with self.lock:
+            table.clear()
+            ring.clear()
+
+    def make_key(self, value):
+        """Return the key for a dict or list in the table, or None if value
+        can't be shared. Leaf values go through intern_data instead."""
+        if not self.subtrees:
+            return None
+
+        type_ = type(value)
+
+        # Members are canonical already, so identity is enough to tell them
+        # apart. A member can't be freed and have its id reused while an
+        # entry that refers to it is still in the table, because the entry
+        # holds the value that holds the member.
+        if type_ is dict:
+            return dict, frozenset(
+                (key, id(member)) for key, member in value.iteritems())
+
+        if type_ is list:
+            return list, tuple(id(member) for member in value)
+
+        return None
+
+    def intern(self, value):
+        """Return the canonical dict or list equal to value. If there isn't
+        one yet, value becomes the canonical object. Anything else is
+        returned as it is."""
+        key = self.make_key(value)
+        if key is None:
+            return value
+
+        tables = self.get_tables()
+        with self.lock:
+            entry = tables[0].get(key)
+            if entry is None:
+                self.store(tables, key, value)
+                return value
+
+            entry[1] = True
+            canonical = entry[0]
+            if canonical is not value:
+                self.hits += 1
+                self.bytes_saved += sys.getsizeof(value)
+            return canonical
+
+    def intern_data(self, type_name, data, convert):
+        """Return the canonical value of the text data read as the builtin
+        type type_name. convert(data) is only called the first time.
+
+        Keying on the text keeps values such as Decimal('1.0') and
+        Decimal('1.00') apart, and is cheaper than hashing the converted
+        value."""
+        key = type_name, data
+        tables = self.get_tables()
+        table = tables[0]
+        with self.lock:
+            entry = table.get(key)
+            if entry is not None:
+                entry[1] = True
+                canonical = entry[0]
+                self.hits += 1
+                self.bytes_saved += sys.getsizeof(canonical)
+                return canonical
+
+        value = convert(data)
+        if type(value) not in self.leaf_types and not self.subtrees:
+            return value
+
+        with self.lock:
+            entry = table.get(key)
+            if entry is not None:
+                # Another thread got there first.
+                return entry[0]
+            self.store(tables, key, value)
+        return value
+
+    def store(self, tables, key, value):
+        """Add a new entry, evicting an old one if the table is full. Call
+        with the lock held."""
+        table, ring = tables
+        self.misses += 1
+        table[key] = [value, False]
+        ring.append(key)
+
+        maxsize = self.maxsize
+        if maxsize is None:
+            return
+
+        # Entries used since they were last passed over go round again.
+        # Each use is paid back by at most one extra step here, so this
+        # takes constant time on average.
+        while len(table) > maxsize:
+            old_key = ring.popleft()
+            old_entry = table[old_key]
+            if old_entry[1]:
+                old_entry[1] = False
+                ring.append(old_key)
+            else:
+                del table[old_key]
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.table)
+
+    def __repr__(self):
+        return '<Interner %d/%s entries at %#x>' % (
+            len(self.table), self.maxsize, id(self))
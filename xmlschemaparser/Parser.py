@@ -1,54 +1,330 @@
 __ALL__ = [
     'parse_xml_filename',
-    'parse_xml_file'
+    'parse_xml_file',
+    'parse_xml_string',
+    'parse_envelope_filename',
+    'parse_envelope_file',
+    'parse_envelope_string',
+    'soap_envelope_uris',
+    'parse_fragment_string',
+    'TreeBuilder',
+    'EnvelopeBuilder',
+    'IndexBuilder',
+    'FragmentBuilder',
 ]
 
 from Element import Element
 from Document import Document
 from xml.parsers import expat
+from cStringIO import StringIO
+import threading
 
-def parse_xml_filename(filename):
-    return parse_xml_file(file(filename, "r"))
+# SOAP 1.1 and SOAP 1.2
+soap_envelope_uris = frozenset((
+    u'http://schemas.xmlsoap.org/soap/envelope/',
+    u'http://www.w3.org/2003/05/soap-envelope',
+))
 
-def parse_xml_file(file_):
-    stack = []
+class TreeBuilder(object):
+    """Builds a Document from expat events. Builders are pooled per thread
+    and reused, so a parse doesn't allocate a new set of handlers. Only the
+    expat parser itself is new each time, since expat can't be reset.
 
-    def xml_decl_handler(version, encoding, standalone):
-        if stack:
+stack: The Document and the open Elements, innermost last.
+
+parser: The expat parser, while a parse is running.
+
+encoding: The encoding to tell expat to use, if not the one the document
+          declares.
+"""
+
+    def __init__(self):
+        self.stack = []
+        self.parser = None
+        self.encoding = None
+        self.handlers = (
+            ('XmlDeclHandler', self.xml_decl_handler),
+            ('DefaultHandlerExpand', self.default_handler),
+            ('StartElementHandler', self.start_handler),
+            ('EndElementHandler', self.end_handler),
+            ('CharacterDataHandler', self.data_handler),
+        )
+
+    def reset(self):
+        """Drop everything from the last parse, so it can be freed."""
+        del self.stack[:]
+        self.parser = None
+        self.encoding = None
+
+    def parse(self, file_):
+        """Parse file_ and return the Document."""
+        parser = self.parser = expat.ParserCreate(self.encoding)
+        # Let expat join adjacent text instead of calling us for each piece.
+        parser.buffer_text = True
+        for name, handler in self.handlers:
+            setattr(parser, name, handler)
+
+        try:
+            parser.ParseFile(file_)
+            return self.finish()
+        finally:
+            self.reset()
+
+    def finish(self):
+        stack = self.stack
+        if len(stack) != 1:
+            raise ValueError("Stack is wrong")
+
+        return stack[0]
+
+    def xml_decl_handler(self, version, encoding, standalone):
+        if self.stack:
             raise ValueError("didn't expect it to end so soon")
-        stack.append(Document(version, standalone))
+        self.stack.append(Document(version, standalone))
 
-    def default_handler(data):
+    def default_handler(self, data):
         if isinstance(data, unicode) and data.isspace():
             pass
         else:
             raise ValueError("Didn't expect %r" % (data,))
 
-    def start_handler(name, attributes):
+    def start_handler(self, name, attributes):
+        stack = self.stack
         el = Element(name, attributes, stack[-1].namespace)
         stack[-1].children.append(el)
         stack.append(el)
 
-    def end_handler(name):
-        stack.pop(-1)
+    def end_handler(self, name):
+        self.stack.pop(-1)
 
-    def data_handler(data):
-        top_children = stack[-1].children
+    def data_handler(self, data):
+        top_children = self.stack[-1].children
         if top_children and isinstance(top_children[-1], unicode):
             top_children[-1] += data
         else:
             top_children.append(data)
 
-    parser = expat.ParserCreate()
-    parser.XmlDeclHandler = xml_decl_handler
-    parser.DefaultHandlerExpand = default_handler
-    parser.StartElementHandler = start_handler
-    parser.EndElementHandler = end_handler
-    parser.CharacterDataHandler = data_handler
+class EnvelopeBuilder(TreeBuilder):
+    """Builds a Document from the payload of a SOAP message. The Document
+    has the contents of the Body as its children, so it can be handed
+    straight to XMLSchemaParser.parse. The Envelope and Body elements
+    themselves are not kept.
+
+keep_header: If false, the Header is skipped without building any
+             Elements. Otherwise it is built as usual and stored as
+             doc.header.
+
+skipping: How deep we are inside a Header being skipped.
+
+seen_body: Whether the Body has started, since there may only be one.
+"""
+
+    def __init__(self):
+        TreeBuilder.__init__(self)
+        self.keep_header = False
+        self.skipping = 0
+        self.seen_body = False
+
+    def reset(self):
+        TreeBuilder.reset(self)
+        self.keep_header = False
+        self.skipping = 0
+        self.seen_body = False
+
+    def parse(self, file_, keep_header=False):
+        self.keep_header = keep_header
+        self.stack.append(Document(None, None))
+        return TreeBuilder.parse(self, file_)
+
+    def xml_decl_handler(self, version, encoding, standalone):
+        doc = self.stack[0]
+        doc.version = version
+        doc.standalone = standalone
+
+    def start_handler(self, name, attributes):
+        if self.skipping:
+            self.skipping += 1
+            return
+
+        stack = self.stack
+        doc = stack[0]
+        el = Element(name, attributes, stack[-1].namespace)
+        depth = len(stack)
+
+        if depth > 2:
+            # Inside the Body or a kept Header
+            stack[-1].children.append(el)
+
+        elif depth == 1:
+            if el.namespace_uri not in soap_envelope_uris \
+                    or el.name != u'Envelope':
+                raise ValueError("Expected a SOAP Envelope, not %r" % (el,))
+
+        elif el.namespace_uri != stack[-1].namespace_uri:
+            raise ValueError("Unexpected %r in %r" % (el, stack[-1]))
+
+        elif el.name == u'Header':
+            if self.seen_body:
+                raise ValueError("Header after the Body in %r" % (stack[-1],))
+            if not self.keep_header:
+                self.skipping = 1
+                return
+            doc.header = el
+
+        elif el.name == u'Body':
+            if self.seen_body:
+                raise ValueError("More than one Body in %r" % (stack[-1],))
+            self.seen_body = True
+            # Payload elements go straight into the document.
+            el.children = doc.children
+
+        else:
+            raise ValueError("Unexpected %r in %r" % (el, stack[-1]))
+
+        stack.append(el)
+
+    def end_handler(self, name):
+        if self.skipping:
+            self.skipping -= 1
+            return
+        self.stack.pop(-1)
+
+    def data_handler(self, data):
+        if self.skipping:
+            return
+
+        if len(self.stack) <= 3:
+            # Only whitespace may go around the envelope parts and payload
+            # elements.
+            if not data.isspace():
+                raise ValueError("Unexpected text %r in %r" % (
+                    data, self.stack[-1]))
+            return
+
+        TreeBuilder.data_handler(self, data)
+
+class IndexBuilder(TreeBuilder):
+    """Builds a Document as TreeBuilder does, and records where elements at
+    the paths chosen in a ByteIndex start and end in the input.
+
+index: The ByteIndex being filled in.
+
+paths: The slash separated path of each open Element, parallel to stack.
+
+entries: The index entry of each open Element, or None if it isn't
+         indexed, parallel to stack.
+"""
+
+    def __init__(self):
+        TreeBuilder.__init__(self)
+        self.index = None
+        self.paths = []
+        self.entries = []
+
+    def reset(self):
+        TreeBuilder.reset(self)
+        self.index = None
+        del self.paths[:]
+        del self.entries[:]
+
+    def parse(self, file_, index):
+        # Entries from an earlier parse would shift every position.
+        index.clear()
+        self.index = index
+        return TreeBuilder.parse(self, file_)
+
+    def xml_decl_handler(self, version, encoding, standalone):
+        TreeBuilder.xml_decl_handler(self, version, encoding, standalone)
+        self.index.encoding = encoding
+
+    def start_handler(self, name, attributes):
+        start = self.parser.CurrentByteIndex
+        stack = self.stack
+        namespace = stack[-1].namespace
+        TreeBuilder.start_handler(self, name, attributes)
+        el = stack[-1]
+
+        paths = self.paths
+        if paths:
+            path = paths[-1] + u'/' + el.name
+        else:
+            path = el.name
+            self.index.root_uri = el.namespace_uri
+        paths.append(path)
+
+        entries = self.index.entries.get(path)
+        if entries is None:
+            self.entries.append(None)
+        else:
+            # The end is filled in by end_handler.
+            entry = [start, None, namespace]
+            entries.append(entry)
+            self.entries.append(entry)
+
+    def end_handler(self, name):
+        TreeBuilder.end_handler(self, name)
+        self.paths.pop(-1)
+        entry = self.entries.pop(-1)
+        if entry is not None:
+            entry[1] = self.parser.CurrentByteIndex
+
+class FragmentBuilder(TreeBuilder):
+    """Builds a Document from a fragment cut out of a larger document. The
+    Document has the one Element in the fragment as its child, with the
+    namespace prefixes that were in scope where it was cut from."""
+
+    def parse(self, file_, namespace, encoding=None):
+        doc = Document(None, None)
+        doc.namespace = namespace
+        self.stack.append(doc)
+        self.encoding = encoding
+        return TreeBuilder.parse(self, file_)
+
+_pools = threading.local()
+
+def parse_with(builder_class, file_, *args):
+    """Parse file_ with an idle builder_class from this thread's pool. A
+    parse started from inside another one simply gets a second builder."""
+    try:
+        pool = _pools.__dict__[builder_class]
+    except KeyError:
+        pool = _pools.__dict__[builder_class] = []
+
+    if pool:
+        builder = pool.pop()
+    else:
+        builder = builder_class()
+
+    try:
+        return builder.parse(file_, *args)
+    finally:
+        pool.append(builder)
+
+def parse_xml_filename(filename, index=None):
+    return parse_xml_file(file(filename, "r"), index)
+
+def parse_xml_string(data, index=None):
+    return parse_xml_file(StringIO(data), index)
+
+def parse_xml_file(file_, index=None):
+    """Parse file_ into a Document. If index is a ByteIndex, the offsets of
+    the elements at its paths are recorded in it as well."""
+    if index is None:
+        return parse_with(TreeBuilder, file_)
+    return parse_with(IndexBuilder, file_, index)
+
+def parse_envelope_filename(filename, keep_header=False):
+    return parse_envelope_file(file(filename, "r"), keep_header)
 
-    parser.ParseFile(file_)
+def parse_envelope_string(data, keep_header=False):
+    return parse_envelope_file(StringIO(data), keep_header)
 
-    if len(stack) != 1:
-        raise ValueError("Stack is wrong")
+def parse_envelope_file(file_, keep_header=False):
+    """Parse a SOAP message into a Document holding the Body payload. See
+    EnvelopeBuilder."""
+    return parse_with(EnvelopeBuilder, file_, keep_header)
 
-    return stack[0]
+def parse_fragment_string(data, namespace, encoding=None):
+    """Parse a single element cut out of a larger document, given the
+    namespace prefixes that were in scope around it."""
+    return parse_with(FragmentBuilder, StringIO(data), namespace, encoding)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""Contains a cache of parse results keyed by the input bytes."""
+
+__ALL__ = [
+    'ResultCache',
+    'FrozenDict',
+    'FrozenList',
+    'freeze',
+]
+
+from collections import OrderedDict
+import hashlib
+import threading
+
+def _immutable(self, *args, **kwargs):
+    raise TypeError("%s is read-only" % (type(self).__name__,))
+
+class FrozenDict(dict):
+    """A dict that can't be modified. Cached results use this so a caller
+    can't change what the next caller gets."""
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __copy__(self):
+        return dict(self)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+class FrozenList(list):
+    """A list that can't be modified."""
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = _immutable
+    __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = reverse = sort = _immutable
+
+    def __copy__(self):
+        return list(self)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+def read_only_setattr(self, name, value):
+    if name in getattr(type(self), '__slots__', ()):
+        # The base type's own state, such as Decimal's, which it sets while
+        # building the value.
+        object.__setattr__(self, name, value)
+        return
+    raise TypeError("%s is read-only" % (type(self).__name__,))
+
+def read_only_delattr(self, name):
+    raise TypeError("%s is read-only" % (type(self).__name__,))
+
+def freeze_extension(value):
+    """Return a read-only copy of an <extension> value, which carries its
+    attributes in __dict__. Copies of the result are mutable again, since
+    they are made with the original extension_type."""
+    type_ = type(value)
+    frozen_type = type(type_.__name__, (type_,), dict(
+        __setattr__ = read_only_setattr,
+        __delattr__ = read_only_delattr))
+    result = frozen_type(value.base_type(value))
+    result.__dict__.update(value.__dict__)
+    return result
+
+def freeze(value):
+    """Return a read-only version of a parse result. Dicts and lists are
+    frozen all the way down, and so are the attributes of <extension>
+    values. Other values are returned as they are."""
+    type_ = type(value)
+    if type_ is dict:
+        return FrozenDict((key, freeze(member))
+            for key, member in value.iteritems())
+    if type_ is list:
+        return FrozenList(freeze(member) for member in value)
+    if getattr(type_, 'extension_type', None) is type_:
+        return freeze_extension(value)
+    return value
+
+class ResultCache(object):
+    """An LRU cache of frozen parse results, keyed by a hash of the input
+    bytes and the fingerprint of the schema that parsed them.
+
+maxcount: The most results to keep. None means no limit.
+
+maxbytes: The most input bytes the cached results may stand for. The input
+          size is used because it is known before parsing and grows with the
+          size of the result. None means no limit.
+
+hits, misses, evictions: Counters of lookups and evicted entries.
+
+One cache may be shared by parsers in many threads.
+"""
+
+    def __init__(self, maxcount=1000, maxbytes=64 * 1024 * 1024):
+        self.maxcount = maxcount
+        self.maxbytes = maxbytes
+        self.table = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """Return the counters as a dict."""
+        return dict(
+            count = len(self.table),
+            nbytes = self.nbytes,
+            hits = self.hits,
+            misses = self.misses,
+            evictions = self.evictions)
+
+    def clear(self):
+        """Drop every cached result. The counters are kept."""
+        with self.lock:
+            self.table.clear()
+            self.nbytes = 0
+
+    def make_key(self, fingerprint, data):
+        """Return the key for data parsed by a schema with fingerprint."""
+        return fingerprint, hashlib.sha1(data).digest()
+
+    def get(self, key):
+        """Return the cached result for key, or raise KeyError."""
+        table = self.table
+        with self.lock:
+            try:
+                size, result = table.pop(key)
+            except KeyError:
+                self.misses += 1
+                raise
+
+            # Move it to the most recently used end.
+            table[key] = size, result
+            self.hits += 1
+            return result
+
+    def put(self, key, size, result):
+        """Freeze result, store it under key and return the frozen result.
+        size is the number of input bytes it came from."""
+        result = freeze(result)
+
+        if self.maxbytes is not None and size > self.maxbytes:
+            # It would only push everything else out.
+            return result
+
+        table = self.table
+        with self.lock:
+            if key in table:
+                self.nbytes -= table.pop(key)[0]
+            table[key] = size, result
+            self.nbytes += size
+
+            while (self.maxcount is not None
+                        and len(table) > self.maxcount) \
+                    or (self.maxbytes is not None
+                        and self.nbytes > self.maxbytes):
+                old_size, old_result = table.popitem(last=False)[1]
+                self.nbytes -= old_size
+                self.evictions += 1
+
+        return result
+
+    def __len__(self):
+        return len(self.table)
+
+    def __repr__(self):
+        return '<ResultCache %d/%s entries, %d/%s bytes at %#x>' % (
+            len(self.table), self.maxcount,
+            self.nbytes, self.maxbytes, id(self))
@@ -6,8 +6,13 @@ __ALL__ = [
     'XMLSchemaParser'
 ]
 
-from Parser import parse_xml_filename, parse_xml_file
+from Parser import parse_xml_filename, parse_xml_file, parse_xml_string
+from Parser import parse_envelope_filename, parse_envelope_file, \
+    parse_envelope_string, soap_envelope_uris
+from Parser import parse_fragment_string
+import copy
 import decimal
+import hashlib
 import re
 import base64
 
@@ -104,6 +109,20 @@ def builtin_gMonth(value):
 def builtin_gDay(value):
     raise NotImplementedError()
 
+def copy_extension(self):
+    """__copy__ for <extension> values. The base type's own __copy__, such
+    as Decimal's, would build a new value and lose the attributes."""
+    result = self.extension_type(self.base_type(self))
+    result.__dict__.update(self.__dict__)
+    return result
+
+def deepcopy_extension(self, memo):
+    """__deepcopy__ for <extension> values."""
+    result = self.extension_type(self.base_type(self))
+    memo[id(self)] = result
+    result.__dict__.update(copy.deepcopy(self.__dict__, memo))
+    return result
+
 def builtin_integer_with_range(constraint):
     def _(value):
         int_value = int(value)
@@ -114,6 +133,10 @@ def builtin_integer_with_range(constraint):
 
 
 class XMLSchemaParser(object):
+    """Parses data against a schema. Nothing on the parser changes after
+    __init__, so one instance may be shared by many threads. The Interner
+    and ResultCache lock their own tables."""
+
     xml_schema_uri = "http://www.w3.org/2001/XMLSchema"
     wsdl_uri = "http://schemas.xmlsoap.org/wsdl/"
     builtin_simple_types = {
@@ -166,9 +189,18 @@ class XMLSchemaParser(object):
 
     }
 
-    def __init__(self, schema):
-        """Initialize the object given a schema, which is an Element."""
+    def __init__(self, schema, interner=None, cache=None):
+        """Initialize the object given a schema, which is an Element.
+
+        interner is an optional Interner. If given, repeated values in the
+        results are replaced by one shared object.
+
+        cache is an optional ResultCache. If given, parsing the same bytes
+        again returns the cached result, which is read-only."""
         self.schema = schema
+        self.interner = interner
+        self.cache = cache
+        self.fingerprint = self.make_fingerprint(schema)
 
         self.targetNamespace = schema.attr['targetNamespace']
 
@@ -183,6 +215,21 @@ class XMLSchemaParser(object):
         self.complexTypes = make_lookup_dict('complexType')
 
 
+    def make_fingerprint(self, schema):
+        """Return a hash of the schema, so results parsed with different
+        schemas never share a cache entry."""
+        digest = hashlib.sha1()
+        stack = [schema]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, unicode):
+                digest.update(node.encode('utf-8'))
+                continue
+            digest.update(repr((node.fullname, sorted(node.attr.items()),
+                len(node.children))))
+            stack.extend(reversed(node.children))
+        return digest.digest()
+
     def find_global_element_by_element(self, element):
         """Given an actual data element, find the global schema element."""
         return self.find_global_element_by_name(*element.fullname)
@@ -208,18 +255,170 @@ class XMLSchemaParser(object):
 
 
 
-    def parse_filename(self, filename):
+    def find_schema_element_by_path(self, namespace_uri, path):
+        """Given the namespace of the root element and a path of local names
+        joined with '/', find the schema element describing the data
+        elements at that path."""
+        names = path.split(u'/')
+        schema_element = self.find_global_element_by_name(
+            namespace_uri, names[0])
+        for name in names[1:]:
+            schema_element = self.find_child_schema_element(
+                schema_element, name)
+        return schema_element
+
+    def find_child_schema_element(self, schema_element, name):
+        """Find the element called name in the sequence of the complexType
+        of schema_element."""
+        type_ = schema_element.attr.get(u'type')
+        if type_ is not None:
+            complexType = self.complexTypes[
+                schema_element.translate_name(type_)]
+        else:
+            complexType, = [child
+                for child in schema_element.children
+                if not isinstance(child, unicode)]
+
+        for sequence in complexType.findall(self.xml_schema_uri, u'sequence'):
+            for item in sequence.findall(self.xml_schema_uri, u'element'):
+                if u'ref' in item.attr:
+                    item = self.find_global_element_by_name(
+                        *item.translate_name(item.attr[u'ref']))
+                if item.attr[u'name'] == name:
+                    return item
+
+        raise ValueError("%r has no element %r" % (schema_element, name))
+
+    def parse_filename(self, filename, index=None):
         """Parse an XML file identified by filename with this schema."""
+        if self.cache is not None or index is not None:
+            return self.parse_file(file(filename, "r"), index)
         return self.parse(parse_xml_filename(filename))
 
-    def parse_file(self, data_file):
-        """Parse an XML file with this schema."""
+    def parse_file(self, data_file, index=None):
+        """Parse an XML file with this schema. If index is a ByteIndex, the
+        file is always parsed, to fill it in."""
+        if index is not None:
+            return self.parse(parse_xml_file(data_file, index))
+        if self.cache is not None:
+            return self.parse_string(data_file.read())
         return self.parse(parse_xml_file(data_file))
 
+    def parse_subtree_filename(self, filename, index, key):
+        """Parse one indexed element of the file identified by filename."""
+        return self.parse_subtree(file(filename, "r"), index, key)
+
+    def parse_subtree(self, data_file, index, key):
+        """Parse only the element at key in index, reading just its bytes
+        from data_file. The result is the same as the element's part of the
+        whole file's result."""
+        path, position = key
+        namespace = index[key][2]
+        doc = parse_fragment_string(index.read_fragment(data_file, key),
+            namespace, index.encoding)
+        data_element, = doc.children
+
+        try:
+            return self.parse_element(
+                self.find_schema_element_by_path(index.root_uri, path),
+                data_element)
+        finally:
+            self.finish_parse()
+
+    def parse_string(self, data):
+        """Parse a string of XML with this schema. If there is a cache, the
+        result may come from it."""
+        return self.parse_cached(data, parse_xml_string, self.parse)
+
+    def parse_envelope_filename(self, filename):
+        """Parse the payload of a SOAP message in the file identified by
+        filename with this schema."""
+        if self.cache is not None:
+            return self.parse_envelope_file(file(filename, "r"))
+        return self.parse_envelope(parse_envelope_filename(filename))
+
+    def parse_envelope_file(self, data_file):
+        """Parse the payload of a SOAP message in a file with this schema."""
+        if self.cache is not None:
+            return self.parse_envelope_string(data_file.read())
+        return self.parse_envelope(parse_envelope_file(data_file))
+
+    def parse_envelope_string(self, data):
+        """Parse the payload of a SOAP message in a string with this
+        schema."""
+        return self.parse_cached(data,
+            parse_envelope_string, self.parse_envelope)
+
+    def parse_cached(self, data, parse_xml, parse):
+        """Build the dom from data with parse_xml and parse it with parse,
+        going through the cache if there is one."""
+        if self.cache is None:
+            return parse(parse_xml(data))
+
+        key = self.cache.make_key((self.fingerprint, parse.__name__), data)
+        try:
+            return self.cache.get(key)
+        except KeyError:
+            pass
+
+        return self.cache.put(key, len(data), parse(parse_xml(data)))
+
+    def parse_envelope(self, doc):
+        """Parse a dom built by parse_envelope_file, which holds the payload
+        of a SOAP Body. A Fault, or a Body without exactly one element,
+        raises ValueError."""
+        payload = [child
+            for child in doc.children
+            if not isinstance(child, unicode)]
+
+        for child in payload:
+            if child.namespace_uri in soap_envelope_uris \
+                    and child.name == u'Fault':
+                # Encoded, so str() of the error works for any fault text.
+                raise ValueError("SOAP Fault: %s" % (
+                    self.fault_text(child).encode('utf-8'),))
+
+        if len(payload) != 1:
+            raise ValueError(
+                "Expected one element in the SOAP Body, not %d" % (
+                    len(payload),))
+
+        try:
+            return self.parse_global_element(payload[0])
+        finally:
+            self.finish_parse()
+
+    def fault_text(self, fault):
+        """Collect the text of a SOAP Fault for an error message."""
+        texts = []
+        stack = [fault]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, unicode):
+                if not node.isspace():
+                    texts.append(node.strip())
+                continue
+            stack.extend(reversed(node.children))
+        return u' '.join(texts)
+
     def parse(self, doc):
         """Parse the entire dom with this schema. This is the principal
         entrance point."""
-        return self.parse_global_element(*doc.children)
+        try:
+            return self.parse_global_element(*doc.children)
+        finally:
+            self.finish_parse()
+
+    def finish_parse(self):
+        """Tidy up after a parse, whether it worked or not."""
+        if self.interner is not None and not self.interner.persistent:
+            self.interner.clear()
+
+    def intern(self, value):
+        """Return the shared copy of value if interning is on."""
+        if self.interner is None:
+            return value
+        return self.interner.intern(value)
 
     def parse_global_element(self, data_element):
         """Find the matching global element and parse the data_element with
@@ -305,15 +504,15 @@ class XMLSchemaParser(object):
 
         # Missing body OK
         if simpleContent:
-            for key, value in attrs:
+            for key, value in attrs.items():
                 setattr(simpleContent, key, value)
             return simpleContent
 
         elif sequence:
             attrs.update(sequence)
-            return attrs
+            return self.intern(attrs)
 
-        return attrs
+        return self.intern(attrs)
 
     def parse_sequence(self, sequence, data_element):
 
@@ -384,7 +583,7 @@ class XMLSchemaParser(object):
             # Don't bother storing empty collections
             if collected:
                 if maxOccurs is None or maxOccurs > 1:
-                    result[expected_name] = collected
+                    result[expected_name] = self.intern(collected)
                 else:
                     result[expected_name] = collected[0]
 
@@ -418,7 +617,12 @@ class XMLSchemaParser(object):
 
         # Create a new class, just for this value, derived from the type of
         # the value and initialized with the value.
-        result = type(str(extension.name), (type(value),), {})(value)
+        class_ = type(str(extension.name), (type(value),), dict(
+            base_type = type(value),
+            __copy__ = copy_extension,
+            __deepcopy__ = deepcopy_extension))
+        class_.extension_type = class_
+        result = class_(value)
 
         # Grab stuff inside this
         for child in extension.children:
@@ -461,7 +665,10 @@ class XMLSchemaParser(object):
             # I'd need to see what element is the context for this to work.
             raise NotImplementedError
 
-        return self.builtin_simple_types[type_name](data)
+        convert = self.builtin_simple_types[type_name]
+        if self.interner is None:
+            return convert(data)
+        return self.interner.intern_data(type_name, data, convert)
 
 
     def parse_element_by_type(self,
@@ -5,33 +5,41 @@ __ALL__ = [
     'from_wsdl_file',
     'from_schema_filename',
     'from_schema_file',
+    'Interner',
+    'ResultCache',
+    'ByteIndex',
+    'load_index_file',
+    'load_index_filename',
 ]
 
 from Parser import parse_xml_filename, parse_xml_file
 
 from XMLSchemaParser import XMLSchemaParser
+from Interner import Interner
+from ResultCache import ResultCache
+from ByteIndex import ByteIndex, load_index_file, load_index_filename
 
-def from_wsdl_file(wsdl_file):
+def from_wsdl_file(wsdl_file, **options):
     wsdl_root, = parse_xml_file(wsdl_file).children
-    return from_wsdl_element(wsdl_root)
+    return from_wsdl_element(wsdl_root, **options)
 
-def from_wsdl_filename(wsdl_file):
+def from_wsdl_filename(wsdl_file, **options):
     wsdl_root, = parse_xml_filename(wsdl_file).children
-    return from_wsdl_element(wsdl_root)
+    return from_wsdl_element(wsdl_root, **options)
 
-def from_wsdl_element(wsdl_element):
+def from_wsdl_element(wsdl_element, **options):
     types, = wsdl_element.findall(XMLSchemaParser.wsdl_uri, "types")
     schema, = types.findall(XMLSchemaParser.xml_schema_uri, "schema")
-    return XMLSchemaParser(schema)
+    return XMLSchemaParser(schema, **options)
 
-def from_schema_file(schema_file):
+def from_schema_file(schema_file, **options):
     schema_root, = parse_xml_file(schema_file).children
-    return from_schema_element(schema_root)
+    return from_schema_element(schema_root, **options)
 
-def from_schema_filename(schema_file):
+def from_schema_filename(schema_file, **options):
     schema_root, = parse_xml_filename(schema_file).children
-    return from_schema_element(schema_root)
+    return from_schema_element(schema_root, **options)
 
-def from_schema_element(schema_element):
-    return XMLSchemaParser(schema)
+def from_schema_element(schema_element, **options):
+    return XMLSchemaParser(schema_element, **options)
 